@@ -1,5 +1,4 @@
 import streamlit as st
-import tempfile
 import os
 from PIL import Image
 import traceback
@@ -8,13 +7,17 @@ import numpy as np
 
 # Try to import custom models with error handling
 try:
-    from models.background_remover import remove_background
+    from models.background_remover import remove_background_bytes, get_session
     BACKGROUND_REMOVAL_AVAILABLE = True
 except ImportError as e:
     st.error(f"Background removal module not available: {e}")
     BACKGROUND_REMOVAL_AVAILABLE = False
     
-    def remove_background(input_path, output_path):
+    def remove_background_bytes(input_bytes, session=None):
+        """Fallback function when rembg is not available"""
+        raise ImportError("Background removal dependencies not installed")
+    
+    def get_session():
         """Fallback function when rembg is not available"""
         raise ImportError("Background removal dependencies not installed")
 
@@ -25,19 +28,42 @@ except ImportError as e:
     st.error(f"Image analysis module not available: {e}")
     IMAGE_ANALYSIS_AVAILABLE = False
     
-    def analyze_image_quality(image_path):
+    # scipy's C Laplacian equals cv2's on the same grayscale input; scores
+    # differ slightly only because the grayscale conversions round
+    # differently. NumPy slicing otherwise
+    try:
+        from scipy.ndimage import laplace
+    except ImportError:
+        laplace = None
+    
+    # ITU-R 601-2 luma weights, as used by PIL's convert('L')
+    LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    
+    def analyze_image_quality(image):
         """Fallback function for basic image analysis using PIL only"""
         try:
-            with Image.open(image_path) as img:
+            if isinstance(image, bytes):
+                source, file_size = BytesIO(image), len(image)
+            else:
+                source, file_size = image, os.path.getsize(image)
+            
+            with Image.open(source) as img:
                 # Basic analysis using PIL
                 width, height = img.size
-                file_size = os.path.getsize(image_path)
                 
-                # Convert to numpy array for basic analysis
-                img_array = np.array(img.convert('L'))  # Convert to grayscale
+                # Grayscale via one BLAS-backed (H*W, 3) @ (3,) product on the
+                # RGB array, rounded to nearest like convert('L') rather than
+                # truncated; int16 so the Laplacian below can go negative
+                rgb = np.asarray(img.convert('RGB'))
+                g = np.rint(rgb @ LUMA_WEIGHTS).astype(np.int16)
                 
-                # Simple blur detection using Laplacian variance
-                laplacian_var = np.var(img_array)
+                # Blur detection using variance of the 4-neighbour Laplacian
+                if laplace is not None:
+                    # mode='mirror' reflects without repeating the edge, like cv2's default border
+                    laplacian_var = float(laplace(g, output=np.float32, mode='mirror').var(dtype=np.float64))
+                else:
+                    lap = g[1:-1, 2:] + g[1:-1, :-2] + g[2:, 1:-1] + g[:-2, 1:-1] - 4 * g[1:-1, 1:-1]
+                    laplacian_var = float(lap.var()) if lap.size else 0.0
                 
                 return {
                     "width": width,
@@ -54,6 +80,21 @@ except ImportError as e:
         except Exception as e:
             return {"error": f"Analysis failed: {str(e)}"}
 
+@st.cache_resource(show_spinner="Loading background removal model...")
+def get_bg_session():
+    """rembg session shared by every rerun and user of this server process."""
+    return get_session()
+
+@st.cache_data(max_entries=32, show_spinner="Removing background...")
+def cached_remove_background(raw: bytes) -> bytes:
+    """Background-removed PNG bytes for uploaded image bytes; cached across reruns."""
+    return remove_background_bytes(raw, session=get_bg_session())
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def analyze_bytes(raw: bytes) -> dict:
+    """Analyze uploaded image bytes in memory; cached on the bytes across reruns."""
+    return analyze_image_quality(raw)
+
 # Page config
 st.set_page_config(
     page_title="Image Processing App",
@@ -63,20 +104,28 @@ st.set_page_config(
 
 # Allowed image extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+ALLOWED_SUFFIXES = frozenset('.' + ext for ext in ALLOWED_EXTENSIONS)
+
+# PIL formats accepted by the header check (MPO is how PIL reports
+# multi-picture JPEGs from many phone cameras)
+VALID_IMAGE_FORMATS = frozenset({'JPEG', 'MPO', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP'})
 
 def is_valid_image_extension(filename):
     """Check if file has allowed extension."""
     if not filename:
         return False
-    extension = filename.split('.')[-1].lower()
-    return extension in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_SUFFIXES
 
 def is_valid_image_file(uploaded_file):
-    """Validate that the uploaded file is actually a valid image."""
+    """
+    Validate that the uploaded file is actually a valid image.
+    
+    Only the header is read; corrupt pixel data is caught by the decode
+    that follows.
+    """
     try:
-        image = Image.open(uploaded_file)
-        image.verify()
-        return True
+        with Image.open(uploaded_file) as image:
+            return image.format in VALID_IMAGE_FORMATS
     except Exception:
         return False
 
@@ -152,8 +201,8 @@ def show_image_analysis():
         with col1:
             st.subheader("Original Image")
             try:
-                image = Image.open(uploaded_file)
-                st.image(image, caption=uploaded_file.name, use_column_width=True)
+                # Raw upload bytes: no PIL decode + re-encode on every rerun
+                st.image(uploaded_file.getvalue(), caption=uploaded_file.name, use_column_width=True)
             except Exception as e:
                 st.error("Error loading image. Please make sure it's a valid image file.")
                 return
@@ -171,41 +220,27 @@ def show_image_analysis():
                         st.error("File is not a valid image.")
                         return
                     
-                    # Reset file pointer again for processing
-                    uploaded_file.seek(0)
+                    # Analyze image
+                    with st.spinner("Analyzing image..."):
+                        results = analyze_bytes(uploaded_file.getvalue())
+                    
+                    # Display results
+                    st.success("Analysis completed!")
                     
-                    # Create temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                        temp_file.write(uploaded_file.read())
-                        temp_path = temp_file.name
+                    # Create metrics display
+                    if 'width' in results and 'height' in results:
+                        st.metric("Resolution", f"{results['width']} × {results['height']}")
                     
-                    try:
-                        # Analyze image
-                        with st.spinner("Analyzing image..."):
-                            results = analyze_image_quality(temp_path)
-                        
-                        # Display results
-                        st.success("Analysis completed!")
-                        
-                        # Create metrics display
-                        if 'width' in results and 'height' in results:
-                            st.metric("Resolution", f"{results['width']} × {results['height']}")
-                        
-                        if 'file_size' in results:
-                            file_size_mb = results['file_size'] / (1024 * 1024)
-                            st.metric("File Size", f"{file_size_mb:.2f} MB")
-                        
-                        if 'blur_score' in results:
-                            st.metric("Blur Score", f"{results['blur_score']:.2f}")
-                        
-                        # Display full results
-                        st.subheader("Detailed Results")
-                        st.json(results)
-                        
-                    finally:
-                        # Clean up temporary file
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
+                    if 'file_size' in results:
+                        file_size_mb = results['file_size'] / (1024 * 1024)
+                        st.metric("File Size", f"{file_size_mb:.2f} MB")
+                    
+                    if 'blur_score' in results:
+                        st.metric("Blur Score", f"{results['blur_score']:.2f}")
+                    
+                    # Display full results
+                    st.subheader("Detailed Results")
+                    st.json(results)
                             
                 except Exception as e:
                     st.error(f"Analysis failed: {str(e)}")
@@ -256,8 +291,8 @@ def show_background_removal():
         with col1:
             st.subheader("Original Image")
             try:
-                image = Image.open(uploaded_file)
-                st.image(image, caption=uploaded_file.name, use_column_width=True)
+                # Raw upload bytes: no PIL decode + re-encode on every rerun
+                st.image(uploaded_file.getvalue(), caption=uploaded_file.name, use_column_width=True)
             except Exception as e:
                 st.error("Error loading image. Please make sure it's a valid image file.")
                 return
@@ -275,45 +310,21 @@ def show_background_removal():
                         st.error("File is not a valid image.")
                         return
                     
-                    # Reset file pointer again for processing
-                    uploaded_file.seek(0)
+                    # Process image (cached per upload, so reruns are instant)
+                    output_bytes = cached_remove_background(uploaded_file.getvalue())
+                    
+                    # Display result
+                    st.image(output_bytes, caption="Background Removed", use_column_width=True)
                     
-                    # Create temporary files
-                    input_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                    output_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
+                    # Provide download button
+                    btn = st.download_button(
+                        label="📥 Download Processed Image",
+                        data=output_bytes,
+                        file_name=f"no_bg_{uploaded_file.name.split('.')[0]}.png",
+                        mime="image/png"
+                    )
                     
-                    try:
-                        # Save uploaded file
-                        input_temp.write(uploaded_file.read())
-                        input_temp.close()
-                        
-                        # Process image
-                        with st.spinner("Removing background..."):
-                            remove_background(input_temp.name, output_temp.name)
-                        
-                        output_temp.close()
-                        
-                        # Display result
-                        processed_image = Image.open(output_temp.name)
-                        st.image(processed_image, caption="Background Removed", use_column_width=True)
-                        
-                        # Provide download button
-                        with open(output_temp.name, "rb") as file:
-                            btn = st.download_button(
-                                label="📥 Download Processed Image",
-                                data=file.read(),
-                                file_name=f"no_bg_{uploaded_file.name.split('.')[0]}.png",
-                                mime="image/png"
-                            )
-                        
-                        st.success("Background removal completed!")
-                        
-                    finally:
-                        # Clean up temporary files
-                        if os.path.exists(input_temp.name):
-                            os.unlink(input_temp.name)
-                        if os.path.exists(output_temp.name):
-                            os.unlink(output_temp.name)
+                    st.success("Background removal completed!")
                             
                 except Exception as e:
                     st.error(f"Background removal failed: {str(e)}")
@@ -1,29 +1,53 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, request, jsonify, send_file
 import os
-import tempfile
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from werkzeug.utils import secure_filename
 from PIL import Image
 import traceback
 
-from models.background_remover import remove_background
-from models.image_analyzer import analyze_image_quality
+from models.background_remover import remove_background_bytes
+from models.image_analyzer import analyze_image_quality, analyze_image_quality_batch
+
+MAX_UPLOAD_SIZE = 16 * 1024 * 1024  # 16MB max file size
+
+class InMemoryUploadRequest(Request):
+    """Request that keeps file uploads in memory up to MAX_UPLOAD_SIZE."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # werkzeug spools uploads over 500KB to a temp file on disk; uploads
+        # are read straight into memory by every endpoint anyway
+        return SpooledTemporaryFile(max_size=MAX_UPLOAD_SIZE, mode='rb+')
 
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.request_class = InMemoryUploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
 
 # Allowed image extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
+ALLOWED_SUFFIXES = frozenset('.' + ext for ext in ALLOWED_EXTENSIONS)
+
+# PIL formats accepted by the header check (MPO is how PIL reports
+# multi-picture JPEGs from many phone cameras)
+VALID_IMAGE_FORMATS = frozenset({'JPEG', 'MPO', 'PNG', 'GIF', 'BMP', 'TIFF', 'WEBP'})
+
+# Maximum number of images accepted by /analyze-batch in one request
+MAX_BATCH_FILES = 16
 
 def allowed_file(filename):
     """Check if file has allowed extension."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_SUFFIXES
 
-def is_valid_image(file_path):
-    """Validate that the file is actually an image."""
+def is_valid_image(file):
+    """
+    Validate that the file (path or file-like object) is actually an image.
+    
+    Only the header is read; corrupt pixel data is caught by the decode
+    that follows in each endpoint.
+    """
     try:
-        with Image.open(file_path) as img:
-            img.verify()
-        return True
+        with Image.open(file) as img:
+            return img.format in VALID_IMAGE_FORMATS
     except Exception:
         return False
 
@@ -34,6 +58,7 @@ def home():
         "message": "Image Processing API",
         "endpoints": {
             "/analyze": "POST - Analyze image quality (resolution, blur detection)",
+            "/analyze-batch": f"POST - Analyze up to {MAX_BATCH_FILES} images in one request",
             "/remove-background": "POST - Remove background from image"
         },
         "usage": "Send image file as 'image' in form-data"
@@ -62,29 +87,85 @@ def analyze_image():
                 "error": "Invalid file type. Allowed types: " + ", ".join(ALLOWED_EXTENSIONS)
             }), 400
         
-        # Save file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        # Read upload into memory; no temp file round-trip
+        raw = file.read()
+        
+        # Validate it's actually an image
+        if not is_valid_image(BytesIO(raw)):
+            return jsonify({"error": "File is not a valid image"}), 400
         
+        # Analyze image quality; corrupt pixel data surfaces as ValueError
         try:
-            # Validate it's actually an image
-            if not is_valid_image(temp_path):
-                return jsonify({"error": "File is not a valid image"}), 400
+            results = analyze_image_quality(raw)
+        except ValueError:
+            return jsonify({"error": "File is not a valid image"}), 400
+        
+        # Add file info
+        results["filename"] = secure_filename(file.filename)
+        results["status"] = "success"
+        
+        return jsonify(results)
+                
+    except Exception as e:
+        return jsonify({
+            "error": "Analysis failed",
+            "details": str(e)
+        }), 500
+
+@app.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyze image quality for several images in one request.
+    
+    Expected: multipart/form-data with one or more 'images' files
+    Returns: JSON with per-image analysis results, in upload order
+    """
+    try:
+        files = request.files.getlist('images')
+        if not files:
+            return jsonify({"error": "No image files provided"}), 400
+        
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({
+                "error": f"Too many files. Maximum is {MAX_BATCH_FILES} images per request"
+            }), 400
+        
+        raws = []
+        for file in files:
+            if file.filename == '':
+                return jsonify({"error": "No file selected"}), 400
             
-            # Analyze image quality
-            results = analyze_image_quality(temp_path)
+            # Validate file extension
+            if not allowed_file(file.filename):
+                return jsonify({
+                    "error": f"Invalid file type for {secure_filename(file.filename)}. "
+                             "Allowed types: " + ", ".join(ALLOWED_EXTENSIONS)
+                }), 400
             
-            # Add file info
-            results["filename"] = secure_filename(file.filename)
-            results["status"] = "success"
+            raw = file.read()
             
-            return jsonify(results)
+            # Validate it's actually an image
+            if not is_valid_image(BytesIO(raw)):
+                return jsonify({
+                    "error": f"File is not a valid image: {secure_filename(file.filename)}"
+                }), 400
             
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+            raws.append(raw)
+        
+        # Analyze all images; corrupt pixel data surfaces as ValueError
+        try:
+            results = analyze_image_quality_batch(raws)
+        except ValueError as e:
+            return jsonify({
+                "error": "File is not a valid image",
+                "details": str(e)
+            }), 400
+        
+        # Add file info
+        for file, result in zip(files, results):
+            result["filename"] = secure_filename(file.filename)
+        
+        return jsonify({"results": results, "status": "success"})
                 
     except Exception as e:
         return jsonify({
@@ -115,36 +196,26 @@ def remove_bg():
                 "error": "Invalid file type. Allowed types: " + ", ".join(ALLOWED_EXTENSIONS)
             }), 400
         
-        # Create temporary files
-        input_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-        output_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
+        # Read upload into memory; no temp file round-trip
+        raw = file.read()
+        
+        # Validate it's actually an image
+        if not is_valid_image(BytesIO(raw)):
+            return jsonify({"error": "File is not a valid image"}), 400
         
+        # Remove background; corrupt pixel data surfaces as ValueError
         try:
-            # Save uploaded file
-            file.save(input_temp.name)
-            input_temp.close()
-            
-            # Validate it's actually an image
-            if not is_valid_image(input_temp.name):
-                return jsonify({"error": "File is not a valid image"}), 400
-            
-            # Remove background
-            remove_background(input_temp.name, output_temp.name)
-            output_temp.close()
-            
-            # Return processed image
-            return send_file(
-                output_temp.name,
-                as_attachment=True,
-                download_name=f"no_bg_{secure_filename(file.filename)}.png",
-                mimetype='image/png'
-            )
-            
-        finally:
-            # Clean up temporary files
-            if os.path.exists(input_temp.name):
-                os.unlink(input_temp.name)
-            # Note: output_temp will be cleaned up by Flask after sending
+            output_bytes = remove_background_bytes(raw)
+        except ValueError:
+            return jsonify({"error": "File is not a valid image"}), 400
+        
+        # Return processed image straight from memory
+        return send_file(
+            BytesIO(output_bytes),
+            as_attachment=True,
+            download_name=f"no_bg_{secure_filename(file.filename)}.png",
+            mimetype='image/png'
+        )
                 
     except Exception as e:
         return jsonify({
@@ -163,9 +234,21 @@ def internal_error(e):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == '__main__':
+    if not os.getenv("DEV"):
+        # The development server handles one request at a time; serve with
+        # a worker pool so OpenCV and rembg work runs on every core
+        print("For production, run the API under gunicorn:")
+        print("  NUMBA_NUM_THREADS=1 OMP_NUM_THREADS=1 \\")
+        print("    gunicorn -w $(nproc) -k gthread --threads 2 -b 0.0.0.0:5000 main:app")
+        print("On a GPU host (onnxruntime-gpu), use one worker so the model is loaded once:")
+        print("  NUMBA_NUM_THREADS=1 gunicorn -w 1 -k gthread --threads 4 -b 0.0.0.0:5000 main:app")
+        print("Set DEV=1 to start the Flask development server instead.")
+        raise SystemExit(1)
+    
     print("Starting Image Processing API...")
     print("Available endpoints:")
     print("  POST /analyze - Analyze image quality")
+    print("  POST /analyze-batch - Analyze several images")
     print("  POST /remove-background - Remove image background")
     print("  GET / - API documentation")
     
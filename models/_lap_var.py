@@ -0,0 +1,68 @@
+"""Fused Laplacian-variance kernel for 8-bit grayscale images."""
+import threading
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Numba's workqueue threading layer (used when tbb/OpenMP are missing)
+# aborts the process if two threads launch parallel kernels at once, even
+# with NUMBA_NUM_THREADS=1. The kernel already spreads over numba's own
+# threads, so serializing launches from server/Streamlit threads is cheap.
+_kernel_lock = threading.Lock()
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _laplacian_sums(img):
+        """
+        Sum and sum of squares of the 4-neighbour Laplacian in one pass.
+
+        Borders are reflected without repeating the edge pixel, matching
+        cv2.Laplacian's default BORDER_REFLECT_101, so the result equals
+        cv2.Laplacian(img, ksize=1) followed by a variance reduction.
+        Integer accumulators keep the sums exact for any realistic size.
+        """
+        height, width = img.shape
+        total = 0
+        total_sq = 0
+        for y in prange(height):
+            ym = y - 1 if y > 0 else min(1, height - 1)
+            yp = y + 1 if y < height - 1 else max(height - 2, 0)
+            row_sum = 0
+            row_sq = 0
+            for x in range(width):
+                xm = x - 1 if x > 0 else min(1, width - 1)
+                xp = x + 1 if x < width - 1 else max(width - 2, 0)
+                lap = (np.int64(img[ym, x]) + np.int64(img[yp, x])
+                       + np.int64(img[y, xm]) + np.int64(img[y, xp])
+                       - 4 * np.int64(img[y, x]))
+                row_sum += lap
+                row_sq += lap * lap
+            total += row_sum
+            total_sq += row_sq
+        return total, total_sq
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """
+    Laplacian variance of a 2-D uint8 image without an intermediate image.
+
+    Args:
+        gray (np.ndarray): Grayscale image
+
+    Returns:
+        float: Variance of the Laplacian (higher is sharper)
+
+    Raises:
+        ImportError: If numba is not installed
+    """
+    if not NUMBA_AVAILABLE:
+        raise ImportError("numba is required for the fused Laplacian kernel")
+
+    with _kernel_lock:
+        total, total_sq = _laplacian_sums(gray)
+    count = gray.shape[0] * gray.shape[1]
+    mean = total / count
+    return float(total_sq / count - mean * mean)
@@ -1,14 +1,118 @@
-from rembg import remove
-from PIL import Image
+from rembg import new_session, remove
+from PIL import Image, ImageOps
+from io import BytesIO
+import onnxruntime as ort
 import os
+import threading
 
-def remove_background(input_path: str, output_path: str):
+# rembg model used for every request. Defaults to the lightweight u2netp
+# (~4.7 MB vs ~176 MB for u2net); set RMBG_MODEL=u2net for full quality or
+# to any other rembg model name, e.g. isnet-general-use.
+MODEL_NAME = os.getenv("RMBG_MODEL", "u2netp")
+
+# ONNX Runtime execution providers in order of preference; those missing
+# from the installed onnxruntime build are skipped. Override with a
+# comma-separated RMBG_PROVIDERS, e.g. "TensorrtExecutionProvider,
+# CUDAExecutionProvider,CPUExecutionProvider".
+PREFERRED_PROVIDERS = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+
+# Images with a longer side above this are downscaled before inference;
+# the predicted mask is upscaled and applied to the full-resolution image.
+MAX_MODEL_SIDE = 1024
+
+# Models that don't return one mask aligned with the input (cloth
+# segmentation stacks a mask per garment class; SAM takes prompts in input
+# pixel coordinates). These always run on the full-resolution image.
+FULL_RESOLUTION_MODELS = frozenset({"u2net_cloth_seg", "sam"})
+
+_session = None
+_session_lock = threading.Lock()
+
+def _providers() -> list:
+    """Execution providers to use, GPU first when this build supports it."""
+    requested = os.getenv("RMBG_PROVIDERS")
+    preferred = [p.strip() for p in requested.split(",")] if requested else PREFERRED_PROVIDERS
+    available = ort.get_available_providers()
+    return [p for p in preferred if p in available] or ["CPUExecutionProvider"]
+
+def get_session():
+    """
+    Return the shared rembg session, loading the model on first use.
+    
+    Creating a session loads the ONNX weights and warms up the runtime, so
+    it is done once per process and reused for every call. Inference runs
+    on the GPU when a CUDA-enabled onnxruntime is installed; each process
+    then holds its own CUDA context and model copy, so GPU hosts should
+    run a single server worker.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = new_session(MODEL_NAME, providers=_providers())
+    return _session
+
+def remove_background_bytes(input_bytes: bytes, session=None) -> bytes:
+    """
+    Remove background from an encoded image held in memory.
+    
+    Large images are processed at MAX_MODEL_SIDE on the longer side and
+    their mask is scaled back up, so the output keeps the full resolution.
+    
+    Args:
+        input_bytes (bytes): Encoded input image
+        session: rembg session to use (default: the shared session)
+    
+    Returns:
+        bytes: PNG-encoded image with transparent background
+    
+    Raises:
+        ValueError: If the input cannot be decoded as an image
+        Exception: If processing fails
+    """
+    try:
+        with Image.open(BytesIO(input_bytes)) as img:
+            # exif_transpose returns a loaded copy, so truncated or corrupt
+            # pixel data is caught here rather than failing inside rembg
+            image = ImageOps.exif_transpose(img)
+    except Exception as e:
+        raise ValueError(f"Could not read image file - may not be a valid image: {str(e)}")
+    
+    try:
+        session = session or get_session()
+        
+        model_name = getattr(session, "model_name", MODEL_NAME)
+        
+        if max(image.size) <= MAX_MODEL_SIDE or model_name in FULL_RESOLUTION_MODELS:
+            cutout = remove(image, session=session)
+        else:
+            original = image.convert("RGBA")
+            small = original.copy()
+            small.thumbnail((MAX_MODEL_SIDE, MAX_MODEL_SIDE))
+            mask = remove(small, session=session, only_mask=True)
+            if mask.size != small.size:
+                # Several masks stacked vertically; let rembg handle the full image
+                cutout = remove(image, session=session)
+            else:
+                # Composite onto transparent black like rembg's naive_cutout, so no
+                # background colour survives under the transparent pixels
+                mask = mask.resize(original.size, Image.Resampling.BILINEAR)
+                cutout = Image.composite(original, Image.new("RGBA", original.size, 0), mask)
+        
+        output = BytesIO()
+        cutout.save(output, format="PNG")
+        return output.getvalue()
+    except Exception as e:
+        raise Exception(f"Failed to remove background: {str(e)}")
+
+def remove_background(input_path: str, output_path: str, session=None):
     """
     Remove background from an image.
     
     Args:
         input_path (str): Path to input image
         output_path (str): Path to save output image
+        session: rembg session to use (default: the shared session)
     
     Raises:
         FileNotFoundError: If input file doesn't exist
@@ -17,11 +121,9 @@ def remove_background(input_path: str, output_path: str):
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input file not found: {input_path}")
     
-    try:
-        with open(input_path, 'rb') as i:
-            input_bytes = i.read()
-            output_bytes = remove(input_bytes)
-            with open(output_path, 'wb') as o:
-                o.write(output_bytes)
-    except Exception as e:
-        raise Exception(f"Failed to remove background: {str(e)}")
\ No newline at end of file
+    with open(input_path, 'rb') as i:
+        input_bytes = i.read()
+    
+    output_bytes = remove_background_bytes(input_bytes, session=session)
+    with open(output_path, 'wb') as o:
+        o.write(output_bytes)
\ No newline at end of file
@@ -1,8 +1,142 @@
 import cv2
 from PIL import Image
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Union
 import numpy as np
 
+from models._lap_var import NUMBA_AVAILABLE, laplacian_variance
+
+# Analysis results keyed by SHA-256 of the file contents, least recently
+# used first. Keyed on the digest rather than the bytes so the cache never
+# holds on to uploads themselves.
+RESULT_CACHE_SIZE = 256
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+def _read_bytes(image_path: str) -> bytes:
+    """
+    Read an image file into memory.
+    
+    Raises:
+        FileNotFoundError: If image file doesn't exist
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+    
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+def _image_size(source) -> tuple:
+    """
+    Read image dimensions from the header only, without decoding pixels.
+    
+    Args:
+        source: Path to image file, or a file-like object
+    
+    Returns:
+        tuple: (width, height)
+    
+    Raises:
+        ValueError: If the header cannot be read
+    """
+    try:
+        with Image.open(source) as img:
+            return img.size
+    except Exception:
+        raise ValueError("Could not read image file - may not be a valid image")
+
+def _load_gray(data: bytes) -> tuple:
+    """
+    Decode encoded image bytes exactly once into a grayscale array.
+    
+    Always decoded at full resolution: Laplacian variance depends on scale,
+    so a reduced decode would not be comparable with the blur threshold.
+    The dimensions are read from the header only.
+    
+    Args:
+        data (bytes): Encoded image file contents
+    
+    Returns:
+        tuple: (grayscale ndarray, (width, height))
+    
+    Raises:
+        ValueError: If image cannot be decoded
+    """
+    width, height = _image_size(BytesIO(data))
+    
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not read image file - may not be a valid image")
+    
+    return gray, (width, height)
+
+def _resolution_score(width: int, height: int) -> float:
+    """Resolution score (0-100, where 100 is reference 256x256) from dimensions."""
+    total_pixels = width * height
+    reference_pixels = 256 * 256  # 1K resolution baseline
+    score = min((total_pixels / reference_pixels) * 100, 100)
+    return round(float(score), 2)  # Ensure it's a Python float
+
+def _laplacian_var(gray: np.ndarray) -> float:
+    """Laplacian variance of a grayscale array (higher is sharper)."""
+    if NUMBA_AVAILABLE:
+        # Fused single pass: uint8 in, scalar out, no intermediate image
+        return laplacian_variance(gray)
+    
+    # 8-bit Laplacian values fit in int16, so CV_16S writes a quarter of the
+    # bytes of CV_64F and runs on cv2's packed-integer SIMD path. ksize=1 is
+    # the 3x3 aperture cv2 uses by default.
+    laplacian = cv2.Laplacian(gray, cv2.CV_16S, ksize=1)
+    return _variance(laplacian)
+
+def _variance(laplacian: np.ndarray) -> float:
+    """Variance of an int16 Laplacian, accumulated in double precision."""
+    _, stddev = cv2.meanStdDev(laplacian)
+    return float(stddev[0, 0]) ** 2
+
+def _is_blurry(laplacian_var: float, threshold: float = 100.0) -> bool:
+    """Blur decision from a precomputed Laplacian variance."""
+    # Convert numpy bool to Python bool for JSON serialization
+    return bool(laplacian_var < threshold)  # lower → blurrier
+
+def _blur_score(laplacian_var: float) -> float:
+    """Blur score from a precomputed Laplacian variance."""
+    # Ensure it's a Python float, not numpy float
+    return round(float(laplacian_var), 2)
+
+def _build_results(laplacian_var: float, width: int, height: int) -> dict:
+    """Assemble the analysis results dict from precomputed measurements."""
+    # Get blur status
+    is_image_blurry = _is_blurry(laplacian_var)
+    
+    return {
+        "resolution_score": _resolution_score(width, height),
+        "is_blurry": is_image_blurry,
+        "blur_score": _blur_score(laplacian_var),
+        "clarity": "Clear" if not is_image_blurry else "Blurry"
+    }
+
+def _cache_get(key: bytes):
+    """Return a copy of the cached results for key, or None."""
+    with _result_cache_lock:
+        results = _result_cache.get(key)
+        if results is None:
+            return None
+        _result_cache.move_to_end(key)
+        return dict(results)
+
+def _cache_put(key: bytes, results: dict) -> None:
+    """Store a copy of results under key, evicting the least recently used."""
+    with _result_cache_lock:
+        _result_cache[key] = dict(results)
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+
 def resolution_score(image_path: str) -> float:
     """
     Calculate resolution score based on image dimensions.
@@ -21,12 +155,8 @@ def resolution_score(image_path: str) -> float:
         raise FileNotFoundError(f"Image file not found: {image_path}")
     
     try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            total_pixels = width * height
-            reference_pixels = 256 * 256  # 1K resolution baseline
-            score = min((total_pixels / reference_pixels) * 100, 100)
-            return round(float(score), 2)  # Ensure it's a Python float
+        width, height = _image_size(image_path)
+        return _resolution_score(width, height)
     except Exception as e:
         raise Exception(f"Failed to analyze resolution: {str(e)}")
 
@@ -49,13 +179,8 @@ def is_blurry(image_path: str, threshold: float = 100.0) -> bool:
         raise FileNotFoundError(f"Image file not found: {image_path}")
     
     try:
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        if image is None:
-            raise Exception("Could not read image file - may not be a valid image")
-        
-        laplacian_var = cv2.Laplacian(image, cv2.CV_64F).var()
-        # Convert numpy bool to Python bool for JSON serialization
-        return bool(laplacian_var < threshold)  # lower → blurrier
+        gray, _ = _load_gray(_read_bytes(image_path))
+        return _is_blurry(_laplacian_var(gray), threshold)
     except Exception as e:
         raise Exception(f"Failed to analyze blur: {str(e)}")
 
@@ -77,41 +202,86 @@ def blur_score(image_path: str) -> float:
         raise FileNotFoundError(f"Image file not found: {image_path}")
     
     try:
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        if image is None:
-            raise Exception("Could not read image file - may not be a valid image")
-        
-        laplacian_var = cv2.Laplacian(image, cv2.CV_64F).var()
-        # Ensure it's a Python float, not numpy float
-        return round(float(laplacian_var), 2)
+        gray, _ = _load_gray(_read_bytes(image_path))
+        return _blur_score(_laplacian_var(gray))
     except Exception as e:
         raise Exception(f"Failed to calculate blur score: {str(e)}")
 
-def analyze_image_quality(image_path: str) -> dict:
+def analyze_image_quality(image: Union[str, bytes]) -> dict:
     """
     Comprehensive image quality analysis.
     
+    The image is decoded once, straight from memory, and its Laplacian
+    variance is computed once; both are shared by every metric below.
+    Results are cached by content hash, so re-analyzing the same bytes
+    skips decoding entirely.
+    
     Args:
-        image_path (str): Path to image file
+        image (str | bytes): Path to image file, or the encoded file contents
     
     Returns:
         dict: Analysis results containing resolution score, blur status, and blur score
+    
+    Raises:
+        ValueError: If the image cannot be decoded
+        Exception: If analysis fails
     """
     try:
-        # Validate that it's actually an image file
-        with Image.open(image_path) as img:
-            img.verify()  # Verify it's a valid image
+        data = _read_bytes(image) if isinstance(image, str) else bytes(image)
+        cache_key = hashlib.sha256(data).digest()
+        
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Get blur status
-        is_image_blurry = is_blurry(image_path)
+        # A failed decode doubles as validation that it's actually an image
+        gray, (width, height) = _load_gray(data)
+        results = _build_results(_laplacian_var(gray), width, height)
         
-        results = {
-            "resolution_score": resolution_score(image_path),
-            "is_blurry": is_image_blurry,
-            "blur_score": blur_score(image_path),
-            "clarity": "Clear" if not is_image_blurry else "Blurry"
-        }
+        _cache_put(cache_key, results)
+        return results
+    except ValueError as e:
+        raise ValueError(f"Image quality analysis failed: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Image quality analysis failed: {str(e)}")
+
+def analyze_image_quality_batch(images: list) -> list:
+    """
+    Image quality analysis for several images in one call.
+    
+    Each image goes through the same decode and Laplacian variance as
+    analyze_image_quality, one at a time so only one decoded image is held
+    in memory, and shares its content-hash cache.
+    
+    Args:
+        images (list): Paths to image files and/or encoded file contents
+    
+    Returns:
+        list: One analysis results dict per input image, in input order
+    
+    Raises:
+        ValueError: If an image cannot be decoded; the message gives its
+            1-based position in the batch
+        Exception: If analysis fails
+    """
+    try:
+        results = []
+        for position, image in enumerate(images, start=1):
+            data = _read_bytes(image) if isinstance(image, str) else bytes(image)
+            cache_key = hashlib.sha256(data).digest()
+            
+            cached = _cache_get(cache_key)
+            if cached is None:
+                try:
+                    gray, (width, height) = _load_gray(data)
+                except ValueError as e:
+                    raise ValueError(f"Image {position}: {str(e)}")
+                cached = _build_results(_laplacian_var(gray), width, height)
+                _cache_put(cache_key, cached)
+            results.append(cached)
         
         return results
+    except ValueError as e:
+        raise ValueError(f"Batch image quality analysis failed: {str(e)}")
     except Exception as e:
-        raise Exception(f"Image quality analysis failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Batch image quality analysis failed: {str(e)}")
\ No newline at end of file